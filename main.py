@@ -2,14 +2,21 @@ import os
 import uuid
 import json
 import zipfile
+import tarfile
 import hashlib
+import mmap
 import threading
 import subprocess
+import concurrent.futures
 import logging
 import shutil
+import tempfile
+import time
 from pathlib import Path
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import psutil
 import webview
 import minecraft_launcher_lib
@@ -23,6 +30,18 @@ minecraft_directory = minecraft_launcher_lib.utils.get_minecraft_directory().rep
 builds_path = Path(minecraft_directory) / "builds"
 config_path = Path(minecraft_directory) / "launcher_config.json"
 log_path = Path(minecraft_directory) / "launcher_logs.txt"
+ui_config_cache_path = Path(minecraft_directory) / "ui_config_cache.json"
+hash_cache_name = ".modhashes.json"
+partial_suffix = ".part"
+download_chunk_size = 128 * 1024
+copy_buffer_size = 1024 * 1024
+status_update_interval = 0.05
+
+
+http_adapter = HTTPAdapter(pool_connections=16, pool_maxsize=16, max_retries=Retry(total=3, backoff_factor=0.3))
+http_session = requests.Session()
+http_session.mount("https://", http_adapter)
+http_session.mount("http://", http_adapter)
 
 
 os.makedirs(minecraft_directory, exist_ok=True)
@@ -48,32 +67,82 @@ def check_logs():
             logging.info("Файл логов очищен (превышен лимит 15MB)")
 
 
+_mac_cache = None
+
+
 def get_first_mac_address():
+    global _mac_cache
+    if _mac_cache is not None:
+        return _mac_cache
+
     try:
         for interface, addrs in psutil.net_if_addrs().items():
             for addr in addrs:
                 if addr.family == psutil.AF_LINK:
-                    return addr.address
+                    _mac_cache = addr.address
+                    return _mac_cache
         return None
     except Exception as e:
         logging.error(f"Ошибка при получении MAC-адреса: {e}")
         return None
 
 
+status_helper_js = """
+    window.__setStatus = function (msg) {
+        const el = document.querySelector('.status-message');
+        if (el) {
+            el.innerText = msg;
+        }
+    };
+"""
+
+
+_status_lock = threading.Lock()
+_last_status_update = 0.0
+
+
+def status_update_due():
+    global _last_status_update
+    with _status_lock:
+        now = time.monotonic()
+        if now - _last_status_update <= status_update_interval:
+            return False
+        _last_status_update = now
+        return True
+
+
 def set_status_message(message: str):
     try:
-        safe_msg = message.replace('"', '\\"')
-        
-        window.evaluate_js(f"""
-            const el = document.querySelector('.status-message');
-            if (el) {{
-                el.innerText = "{safe_msg}";
-            }}
-        """)
+        window.evaluate_js("window.__setStatus && window.__setStatus(" + json.dumps(message) + ")")
     except Exception as e:
         logging.error(f"Ошибка при обновлении прогресса: {e}")
 
 
+_hash_buffers = threading.local()
+
+
+def get_file_hash(path):
+    with open(path, "rb") as f:
+        try:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return hashlib.sha256(mm).hexdigest()
+        except (ValueError, OSError):
+            pass
+
+        if hasattr(hashlib, "file_digest"):
+            return hashlib.file_digest(f, "sha256").hexdigest()
+
+        if not hasattr(_hash_buffers, "buf"):
+            _hash_buffers.buf = bytearray(1 << 20)
+            _hash_buffers.view = memoryview(_hash_buffers.buf)
+        buf, view = _hash_buffers.buf, _hash_buffers.view
+
+        h = hashlib.sha256()
+        while n := f.readinto(buf):
+            h.update(view[:n])
+        return h.hexdigest()
+
+
 def get_total_ram_mb():
     total_bytes = psutil.virtual_memory().total
     return total_bytes // (1024 * 1024)
@@ -83,6 +152,7 @@ def get_total_ram_mb():
 class ConfigManager:
     def __init__(self):
         self.config_path = Path(config_path)
+        self._cache = None
         self.create_config()
 
     def create_config(self):
@@ -100,12 +170,15 @@ class ConfigManager:
                 json.dump(default_config, f, indent=4)
 
     def load_config(self):
-        with open(self.config_path, "r") as f:
-            return json.load(f)
+        if self._cache is None:
+            with open(self.config_path, "r") as f:
+                self._cache = json.load(f)
+        return self._cache
 
     def save_config(self, config):
         with open(self.config_path, "w") as f:
             json.dump(config, f, indent=4)
+        self._cache = config
 
     def open_folder(self):
         if os.name == 'nt':
@@ -119,32 +192,59 @@ class ConfigManager:
             logging.error(f"Неизвестная операционная система. Не удается открыть папку.")
 
     def get_ams(self):
-        with open(self.config_path, "r") as f:
-            config = json.load(f)
-        return config.get("ams", None)
+        return self.load_config().get("ams", None)
 
 
 class ModManager:
-    def __init__(self):
-        self.config_manager = ConfigManager()
+    def __init__(self, config_manager):
+        self.config_manager = config_manager
         self.api_url = self.config_manager.get_ams()
 
-    def download_mod(self, mod_name, server_name, mods_directory):
+    def download_mod(self, mod_name, server_name, mods_directory, remote_hash=None):
         local_path = mods_directory / mod_name
+        part_path = mods_directory / f"{mod_name}{partial_suffix}"
 
         try:
-            response = requests.get(url = f"{self.api_url}/launcher/{server_name}/download_mod/{mod_name}", stream=True, verify=True)
-            if response.status_code == 200:
+            existing = part_path.stat().st_size if part_path.exists() else 0
+            headers = {"Range": f"bytes={existing}-", "Accept-Encoding": "identity"} if existing else {}
+
+            response = http_session.get(url = f"{self.api_url}/launcher/{server_name}/download_mod/{mod_name}", headers=headers, stream=True, verify=True)
+            if response.status_code == 416 and existing:
+                os.remove(part_path)
+                return self.download_mod(mod_name, server_name, mods_directory, remote_hash)
+
+            if response.status_code in (200, 206):
+                resumed = response.status_code == 206
+                downloaded = existing if resumed else 0
                 total_size = int(response.headers.get('Content-Length', 0))
-                downloaded = 0
+                if total_size:
+                    total_size += downloaded
+                last_percent = -1
 
-                with open(local_path, "wb") as file:
-                    for chunk in response.iter_content(1024):
+                if resumed:
+                    logging.info(f"Продолжаем скачивание {mod_name} с {existing} байт.")
+
+                with open(part_path, "ab" if resumed else "wb") as file:
+                    for chunk in response.iter_content(chunk_size=download_chunk_size):
                         file.write(chunk)
                         downloaded += len(chunk)
+                        if not total_size:
+                            continue
                         percent = int(downloaded * 100 / total_size)
-                        set_status_message(f"Скачивание {mod_name}: {percent}%")
 
+                        if percent != last_percent and status_update_due():
+                            set_status_message(f"Скачивание {mod_name}: {percent}%")
+                            last_percent = percent
+
+                if remote_hash and get_file_hash(part_path) != remote_hash:
+                    os.remove(part_path)
+                    if resumed:
+                        return self.download_mod(mod_name, server_name, mods_directory, remote_hash)
+                    logging.error(f"Хэш скачанного мода {mod_name} не совпадает с сервером.")
+                    set_status_message(f"Не удалось скачать {mod_name} ❌")
+                    return
+
+                os.replace(part_path, local_path)
                 logging.info(f"Мод {mod_name} успешно скачан.")
 
                 set_status_message(f"Мод {mod_name} успешно скачан ✅")
@@ -156,17 +256,55 @@ class ModManager:
             set_status_message(f"Ошибка при скачивании {mod_name} ❌")
 
     def get_remote_mods_dict(self, server_name):
-        response = requests.get(url = f"{self.api_url}/launcher/{server_name}/list_mod", verify=True)
+        response = http_session.get(url = f"{self.api_url}/launcher/{server_name}/list_mod", verify=True)
         if response.status_code == 200:
             return response.json()
 
-    def get_local_mods_dict(self, mods_directory):
+    def _load_hash_cache(self, mods_directory):
+        try:
+            with open(mods_directory / hash_cache_name, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_hash_cache(self, mods_directory, cache):
+        try:
+            with open(mods_directory / hash_cache_name, "w") as f:
+                json.dump(cache, f, indent=4)
+        except OSError as e:
+            logging.error(f"Ошибка при сохранении кэша хэшей: {e}")
+
+    def get_local_mods_dict(self, mods_directory, remote_sizes=None):
+        remote_sizes = remote_sizes or {}
+        cache = self._load_hash_cache(mods_directory)
         files = {}
-        for f in mods_directory.iterdir():
-            if f.is_file():
-                with open(f, "rb") as file:
-                    file_hash = hashlib.sha256(file.read()).hexdigest()
-                    files[f.name] = file_hash
+        stale = []
+
+        with os.scandir(mods_directory) as it:
+            entries = [e for e in it if e.is_file() and e.name != hash_cache_name and not e.name.endswith(partial_suffix)]
+
+        for f in entries:
+            st = f.stat()
+            entry = cache.get(f.name)
+            remote_size = remote_sizes.get(f.name)
+            if remote_size is not None and remote_size != st.st_size:
+                files[f.name] = None
+            elif entry and entry.get("size") == st.st_size and entry.get("mtime_ns") == st.st_mtime_ns:
+                files[f.name] = entry["sha256"]
+            else:
+                stale.append((f, st))
+
+        if stale:
+            workers = min(os.cpu_count() or 1, len(stale))
+            with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+                hashes = executor.map(get_file_hash, [f for f, _ in stale])
+
+            for (f, st), file_hash in zip(stale, hashes):
+                files[f.name] = file_hash
+                cache[f.name] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": file_hash}
+
+        cache = {name: entry for name, entry in cache.items() if files.get(name)}
+        self._save_hash_cache(mods_directory, cache)
         return files
 
     def check_mods(self, server_name):
@@ -175,7 +313,13 @@ class ModManager:
         os.makedirs(mods_directory, exist_ok=True)
 
         remote_mods = self.get_remote_mods_dict(server_name)
-        local_mods = self.get_local_mods_dict(mods_directory)
+        remote_sizes = {}
+        for name, info in remote_mods.items():
+            if isinstance(info, dict):
+                remote_mods[name] = info.get("sha256")
+                remote_sizes[name] = info.get("size")
+
+        local_mods = self.get_local_mods_dict(mods_directory, remote_sizes)
 
         for local_mod in list(local_mods.keys()):
             if local_mod not in remote_mods:
@@ -184,22 +328,35 @@ class ModManager:
                 logging.info(f"Удалён мод: {local_mod}")
                 set_status_message(f"Удалён мод: {local_mod}")
 
+        for part_path in mods_directory.glob(f"*{partial_suffix}"):
+            if part_path.name[:-len(partial_suffix)] not in remote_mods:
+                os.remove(part_path)
+                logging.info(f"Удалён недокачанный файл: {part_path.name}")
+
+        to_download = []
         for remote_mod, remote_hash in remote_mods.items():
             local_hash = local_mods.get(remote_mod)
 
             if local_hash != remote_hash:
-                if local_hash is None:
+                if remote_mod not in local_mods:
                     logging.info(f"Мод {remote_mod} отсутствует локально. Скачиваем.")
                     set_status_message(f"Мод {remote_mod} отсутствует локально. Скачиваем...")
+                elif local_hash is None:
+                    logging.info(f"Размер мода {remote_mod} не совпадает. Обновляем мод.")
+                    set_status_message(f"Размер мода {remote_mod} не совпадает. Обновляем мод...")
                 else:
                     logging.info(f"Хэш мода {remote_mod} не совпадает. Обновляем мод.")
                     set_status_message(f"Хэш мода {remote_mod} не совпадает. Обновляем мод...")
-                self.download_mod(remote_mod, server_name, mods_directory)
+                to_download.append(remote_mod)
+
+        if to_download:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+                list(executor.map(lambda mod: self.download_mod(mod, server_name, mods_directory, remote_mods[mod]), to_download))
 
 
 class VersionManager:
-    def __init__(self):
-        self.config_manager = ConfigManager()
+    def __init__(self, config_manager):
+        self.config_manager = config_manager
         self.api_url = self.config_manager.get_ams()
         self.minecraft_dir = minecraft_directory
 
@@ -221,43 +378,109 @@ class VersionManager:
             set_status_message(f"Требуемая версия {required_version} уже установлена.")
 
         
+    def _report_download_progress(self, stream, total_size, done):
+        last_percent = 0
+        while not done.wait(0.2):
+            if not total_size:
+                continue
+            percent = int(stream.tell() * 100 / total_size)
+
+            if percent > last_percent:
+                set_status_message(f"Скачивание: {percent}%")
+                last_percent = percent
+
+    def _extract_archive(self, zip_ref, build_path):
+        root = Path(build_path).resolve()
+        for member in zip_ref.infolist():
+            target = (root / member.filename).resolve()
+            if root not in target.parents:
+                logging.error(f"Пропущен файл с недопустимым путём: {member.filename}")
+                continue
+
+            if member.is_dir():
+                os.makedirs(target, exist_ok=True)
+                continue
+
+            os.makedirs(target.parent, exist_ok=True)
+            with zip_ref.open(member) as src, open(target, "wb") as dst:
+                shutil.copyfileobj(src, dst, length=copy_buffer_size)
+
+    def _extract_tar_stream(self, stream, build_path):
+        with tarfile.open(fileobj=stream, mode="r|*") as tar:
+            if hasattr(tarfile, "data_filter"):
+                tar.extractall(build_path, filter="data")
+                return
+
+            root = Path(build_path).resolve()
+            for member in tar:
+                target = (root / member.name).resolve()
+                if root not in target.parents or member.issym() or member.islnk():
+                    logging.error(f"Пропущен файл с недопустимым путём: {member.name}")
+                    continue
+                tar.extract(member, build_path)
+
+    def _move_into_build(self, staging_path, build_path):
+        for root, dirs, files in os.walk(staging_path):
+            target_root = Path(build_path) / Path(root).relative_to(staging_path)
+            os.makedirs(target_root, exist_ok=True)
+            for name in files + [d for d in dirs if os.path.islink(os.path.join(root, d))]:
+                os.replace(os.path.join(root, name), target_root / name)
+
+    def _download_zip(self, response, build_path, staging_path, stop_progress):
+        archive = tempfile.NamedTemporaryFile(dir=build_path, suffix=".zip", delete=False)
+        try:
+            with archive:
+                try:
+                    shutil.copyfileobj(response.raw, archive, length=copy_buffer_size)
+                finally:
+                    stop_progress()
+                set_status_message(f"Скачивание завершено.")
+
+                set_status_message("Распаковка файлов...")
+                archive.seek(0)
+                with zipfile.ZipFile(archive, 'r') as zip_ref:
+                    self._extract_archive(zip_ref, staging_path)
+        finally:
+            try:
+                os.remove(archive.name)
+            except Exception as e:
+                logging.error(f"Ошибка при удалении архива: {e}")
+
     def download_fabric_base(self, server_name):
         build_path = Path(builds_path) / server_name
 
         os.makedirs(build_path, exist_ok=True)
         
-        local_zip_path = Path(build_path) / "base_fabric.zip"
-
-
-        response = requests.get(url = f"{self.api_url}/launcher/{server_name}/download_fabric", stream=True, verify=True)
+        response = http_session.get(url = f"{self.api_url}/launcher/{server_name}/download_fabric", stream=True, verify=True)
         if response.status_code == 200:
             total_size = int(response.headers.get('Content-Length', 0))
-            downloaded = 0
-            last_percent = 0
-
-            with open(local_zip_path, 'wb') as file:
-                for data in response.iter_content(1024):
-                    file.write(data)
-                    downloaded += len(data)
-                    percent = int(downloaded * 100 / total_size)
+            content_type = response.headers.get('Content-Type', '')
+            response.raw.decode_content = True
+            done = threading.Event()
+            progress = threading.Thread(target=self._report_download_progress, args=(response.raw, total_size, done), daemon=True)
+            progress.start()
 
-                    if percent > last_percent:
-                        set_status_message(f"Скачивание: {percent}%")
-                        last_percent = percent
+            def stop_progress():
+                done.set()
+                progress.join()
 
-            set_status_message(f"Скачивание завершено.")
+            staging_path = Path(tempfile.mkdtemp(dir=build_path, prefix=".staging-"))
 
             try:
-                set_status_message("Распаковка файлов...")
-                with zipfile.ZipFile(local_zip_path, 'r') as zip_ref:
-                    zip_ref.extractall(build_path)
-            except Exception as e:
-                logging.error(f"Ошибка при распаковке архива: {e}")
-
-            try:
-                os.remove(local_zip_path)
+                if "tar" in content_type or "gzip" in content_type:
+                    set_status_message("Скачивание и распаковка файлов...")
+                    self._extract_tar_stream(response.raw, staging_path)
+                else:
+                    self._download_zip(response, build_path, staging_path, stop_progress)
+                stop_progress()
+                self._move_into_build(staging_path, build_path)
             except Exception as e:
-                logging.error(f"Ошибка при удалении архива: {e}")
+                logging.error(f"Ошибка при установке сборки: {e}")
+                set_status_message("Ошибка при скачивании ❌")
+                return
+            finally:
+                stop_progress()
+                shutil.rmtree(staging_path, ignore_errors=True)
 
             set_status_message("Готово ✅")
         else:
@@ -274,10 +497,10 @@ class VersionManager:
 
 
 class Launcher:
-    def __init__(self):
-        self.version_manager = VersionManager()
-        self.mod_manager = ModManager()
-        self.config_manager = ConfigManager()
+    def __init__(self, config_manager):
+        self.version_manager = VersionManager(config_manager)
+        self.mod_manager = ModManager(config_manager)
+        self.config_manager = config_manager
 
     def close(self):
         os._exit(0)
@@ -309,11 +532,15 @@ class Launcher:
             logging.info(f"Игра запущена...")
 
 
-            mac_address = get_first_mac_address()
-            generated_uuid = str(uuid.uuid5(uuid.NAMESPACE_DNS, mac_address))
-
             config = self.config_manager.load_config()
 
+            generated_uuid = config.get("client_uuid")
+            if not generated_uuid:
+                mac_address = get_first_mac_address()
+                generated_uuid = str(uuid.uuid5(uuid.NAMESPACE_DNS, mac_address))
+                config["client_uuid"] = generated_uuid
+                self.config_manager.save_config(config)
+
             nickname = config.get("nickname", "Player")
             ram = config.get("ram", "")
             jvm_args = config.get("jvm_args", "")
@@ -372,10 +599,10 @@ class Launcher:
 
 
 class LauncherAPI:
-    def __init__(self):
-        self.launcher = Launcher()
-        self.config_manager = ConfigManager()
-        self.version_manager = VersionManager()
+    def __init__(self, config_manager):
+        self.launcher = Launcher(config_manager)
+        self.config_manager = config_manager
+        self.version_manager = self.launcher.version_manager
 
     def save_config(self, config):
         return self.config_manager.save_config(config)
@@ -397,38 +624,69 @@ class LauncherAPI:
 
 
 class WebviewStart:
-    def __init__(self):
-        self.api = LauncherAPI()
-        self.config_manager = ConfigManager()
+    def __init__(self, config_manager):
+        self.api = LauncherAPI(config_manager)
+        self.config_manager = config_manager
         self.api_url = self.config_manager.get_ams()
 
-    def create_window(self):
+    def fetch_ui_config(self):
+        response = requests.get(f"{self.api_url}/launcher/ui/config", timeout=10)
+        response.raise_for_status()
+        config_ui = response.json()
+        logging.info(f"UI-конфиг успешно загружен")
+
+        try:
+            with open(ui_config_cache_path, "w") as f:
+                json.dump(config_ui, f, indent=4)
+        except OSError as e:
+            logging.error(f"Ошибка при сохранении кэша UI-конфига: {e}")
+
+        return config_ui
+
+    def refresh_ui_config(self):
         try:
-            response = requests.get(f"{self.api_url}/launcher/ui/config")
-            response.raise_for_status()
-            config_ui = response.json()
-            logging.info(f"UI-конфиг успешно загружен")
+            self.fetch_ui_config()
         except Exception as e:
             logging.error(f"Ошибка загрузки UI-конфига: {e}")
-            config_ui = {
-                "title": launcher_name,
-                "background_color": "#222222",
-                "min_size": [600, 400],
-                "transparent": False,
-                "frameless": False,
-                "resizable": True,
-                "height": 600,
-                "width": 900,
-        }
+
+    def load_cached_ui_config(self):
+        try:
+            with open(ui_config_cache_path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def create_window(self):
+        config_ui = self.load_cached_ui_config()
+        if config_ui is not None:
+            threading.Thread(target=self.refresh_ui_config, daemon=True).start()
+        else:
+            try:
+                config_ui = self.fetch_ui_config()
+            except Exception as e:
+                logging.error(f"Ошибка загрузки UI-конфига: {e}")
+                config_ui = {
+                    "title": launcher_name,
+                    "background_color": "#222222",
+                    "min_size": [600, 400],
+                    "transparent": False,
+                    "frameless": False,
+                    "resizable": True,
+                    "height": 600,
+                    "width": 900,
+            }
 
         config_ui["url"] = f"{self.api_url}/launcher/ui/index.html"
         config_ui["js_api"] = self.api
 
-        return webview.create_window(**config_ui)
+        main_window = webview.create_window(**config_ui)
+        main_window.events.loaded += lambda: main_window.evaluate_js(status_helper_js)
+        return main_window
 
 
 
 if __name__ == "__main__":
     check_logs()
-    window = WebviewStart().create_window()
+    config_manager = ConfigManager()
+    window = WebviewStart(config_manager).create_window()
     webview.start()